@@ -0,0 +1,65 @@
+import logging
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Cliente de Redis; si REDIS_URL no está configurada el cache queda desactivado.
+# Timeouts cortos para que un Redis lento o caído se trate como un miss y no bloquee
+redis_client = (
+    Redis.from_url(settings.REDIS_URL, socket_connect_timeout=0.2, socket_timeout=0.2)
+    if settings.REDIS_URL else None
+)
+
+# Llaves del cache
+ASUNTOS_LIST_KEY = "asuntos:list:v1"
+
+
+def asunto_detail_key(asunto_id: int) -> str:
+    return f"asuntos:detail:{asunto_id}"
+
+
+def asunto_instancias_key(asunto_id: int) -> str:
+    return f"asuntos:instancias:{asunto_id}"
+
+
+def instancia_counts_key(instancia_id: int) -> str:
+    return f"inst:counts:{instancia_id}"
+
+
+async def cache_get(key: str) -> bytes | None:
+    """
+    Obtiene un valor del cache; retorna None si no existe o si Redis falla
+    """
+    if redis_client is None:
+        return None
+    try:
+        return await redis_client.get(key)
+    except RedisError as e:
+        logger.warning(f"Error al leer cache {key}: {str(e)}")
+        return None
+
+
+async def cache_set(key: str, value: bytes) -> None:
+    """
+    Guarda un valor en el cache con el TTL configurado
+    """
+    if redis_client is None:
+        return
+    try:
+        await redis_client.setex(key, settings.CACHE_TTL, value)
+    except RedisError as e:
+        logger.warning(f"Error al escribir cache {key}: {str(e)}")
+
+
+async def cache_delete(*keys: str) -> None:
+    """
+    Invalida una o más llaves del cache
+    """
+    if redis_client is None or not keys:
+        return
+    try:
+        await redis_client.delete(*keys)
+    except RedisError as e:
+        logger.warning(f"Error al invalidar cache {keys}: {str(e)}")
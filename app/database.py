@@ -1,5 +1,7 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy import event, String
+from sqlalchemy.pool import NullPool
+from uuid import uuid4
 import ssl
 from app.settings import settings
 
@@ -20,33 +22,73 @@ if 'sslmode=disable' in database_url:
 print(f"📊 Conectando a BD: {database_url.split('@')[1] if '@' in database_url else '***'}")
 print(f"🔒 Modo SSL: {'REQUERIDO (Render)' if is_remote else 'Desactivado (Local)'}")
 
-# Configurar SSL para conexiones remotas
-connect_args = {}
+print(f"🔁 Modo de conexiones: {settings.DB_MODE}")
+
+if settings.USE_PGBOUNCER:
+    # PgBouncer en modo transacción: las sentencias preparadas no sobreviven entre
+    # transacciones, así que se desactiva el cache y se usan nombres únicos.
+    # PgBouncer tampoco acepta parámetros de inicio arbitrarios como jit.
+    connect_args = {
+        "statement_cache_size": 0,
+        "prepared_statement_cache_size": 0,
+        "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        "server_settings": {},
+    }
+else:
+    # Cache de sentencias preparadas para no re-planificar las consultas repetidas
+    connect_args = {
+        "statement_cache_size": 1024,
+        "prepared_statement_cache_size": 1024,
+        "server_settings": {},
+    }
 
+# Configurar SSL para conexiones remotas
 if is_remote:
     # Crear un contexto SSL seguro para Render/Neon
     ssl_context = ssl.create_default_context()
     ssl_context.check_hostname = True
     ssl_context.verify_mode = ssl.CERT_REQUIRED
-    connect_args = {
-        "ssl": ssl_context,
-        "server_settings": {"application_name": "muni_backend"}
-    }
+    connect_args["ssl"] = ssl_context
+    connect_args["server_settings"]["application_name"] = "muni_backend"
 else:
     # Para localhost no usar SSL
-    connect_args = {"ssl": False}
+    connect_args["ssl"] = False
+
+# Con PgBouncer el pool lo mantiene PgBouncer; cada proceso abre conexiones lógicas
+# baratas sin pool propio, así el total hacia Postgres no crece con los workers
+if settings.USE_PGBOUNCER:
+    pool_args = {"poolclass": NullPool}
+else:
+    pool_args = {
+        "pool_pre_ping": True,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": 10,
+        "pool_recycle": 1800,
+    }
 
 # Crear el engine asincrónico
 engine = create_async_engine(
     database_url,
     echo=settings.DEBUG,
     future=True,
-    pool_pre_ping=True,
-    pool_size=5,
-    max_overflow=10,
-    connect_args=connect_args
+    connect_args=connect_args,
+    **pool_args
 )
 
+if not settings.USE_PGBOUNCER:
+    # JIT desactivado porque solo agrega latencia a consultas OLTP cortas; se fija con SET
+    # al abrir la conexión y no como parámetro de inicio, que un pooler podría rechazar.
+    # Se ejecuta en autocommit: dentro de una transacción el rollback del pool lo desharía
+    @event.listens_for(engine.sync_engine, "connect")
+    def desactivar_jit(dbapi_connection, connection_record):
+        autocommit_previo = dbapi_connection.autocommit
+        dbapi_connection.autocommit = True
+        cursor = dbapi_connection.cursor()
+        cursor.execute("SET jit = off")
+        cursor.close()
+        dbapi_connection.autocommit = autocommit_previo
+
 # Crear sesión asincrónica
 AsyncSessionLocal = async_sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
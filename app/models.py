@@ -1,67 +1,85 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Date
-from sqlalchemy.ext.declarative import declarative_base
-from datetime import datetime
+from sqlalchemy import String, ForeignKey, UniqueConstraint, Index
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
+from datetime import datetime, date
+from app.utils import utcnow
+
+
+class Base(DeclarativeBase):
+    pass
 
-Base = declarative_base()
 
 class Usuario(Base):
     __tablename__ = "usuarios"
     __table_args__ = {"extend_existing": True}
-    
-    id = Column(Integer, primary_key=True, index=True)
-    username = Column(String(50), unique=True, nullable=False, index=True)
-    email = Column(String(255), unique=True, nullable=False, index=True)
-    nombre = Column(String(255), nullable=False)
-    password_hash = Column(String(255), nullable=False)
-    rol = Column(String(50), default="usuario", nullable=False)  # usuario, admin
-    activo = Column(Boolean, default=True, nullable=False)
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    id: Mapped[int] = mapped_column(primary_key=True, index=True)
+    username: Mapped[str] = mapped_column(String(50), unique=True, index=True)
+    email: Mapped[str] = mapped_column(String(255), unique=True, index=True)
+    nombre: Mapped[str] = mapped_column(String(255))
+    password_hash: Mapped[str] = mapped_column(String(255))
+    rol: Mapped[str] = mapped_column(String(50), default="usuario")  # usuario, admin
+    activo: Mapped[bool] = mapped_column(default=True)
+    created_at: Mapped[datetime] = mapped_column(default=utcnow)
+    updated_at: Mapped[datetime] = mapped_column(default=utcnow, onupdate=utcnow)
 
 class Persona(Base):
     __tablename__ = "personas"
     __table_args__ = {"extend_existing": True}
-    
-    id = Column(Integer, primary_key=True, index=True)
-    rut = Column(String(20), unique=True, nullable=False)
-    apellidos = Column(String(255), nullable=False)
-    nombres = Column(String(255), nullable=False)
+
+    id: Mapped[int] = mapped_column(primary_key=True, index=True)
+    rut: Mapped[str] = mapped_column(String(20), unique=True)
+    apellidos: Mapped[str] = mapped_column(String(255))
+    nombres: Mapped[str] = mapped_column(String(255))
 
 
 class Asunto(Base):
     __tablename__ = "asuntos"
     __table_args__ = {"extend_existing": True}
-    
-    id = Column(Integer, primary_key=True, index=True)
-    nombre = Column(String(255), unique=True, nullable=False)
-    tipo = Column(String(50), nullable=False)  # taller, entrega, otra
-    descripcion = Column(String(500), nullable=True)
-    coordinadora = Column(String(255), nullable=False)
-    lugar = Column(String(255), nullable=False)
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    id: Mapped[int] = mapped_column(primary_key=True, index=True)
+    nombre: Mapped[str] = mapped_column(String(255), unique=True)
+    tipo: Mapped[str] = mapped_column(String(50))  # taller, entrega, otra
+    descripcion: Mapped[str | None] = mapped_column(String(500))
+    coordinadora: Mapped[str] = mapped_column(String(255))
+    lugar: Mapped[str] = mapped_column(String(255))
+    created_at: Mapped[datetime] = mapped_column(default=utcnow)
 
 
 class AsuntoInstancia(Base):
     __tablename__ = "asunto_instancias"
-    __table_args__ = {"extend_existing": True}
-    
-    id = Column(Integer, primary_key=True, index=True)
-    asunto_id = Column(Integer, ForeignKey("asuntos.id"), nullable=False)
-    fecha = Column(Date, nullable=False)
-    lugar = Column(String(255), nullable=True)
-    coordinadora = Column(String(255), nullable=True)
-    observaciones = Column(String(500), nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    __table_args__ = (
+        Index("ix_inst_asunto_fecha", "asunto_id", "fecha"),
+        {"extend_existing": True},
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, index=True)
+    asunto_id: Mapped[int] = mapped_column(ForeignKey("asuntos.id"))
+    fecha: Mapped[date]
+    lugar: Mapped[str | None] = mapped_column(String(255))
+    coordinadora: Mapped[str | None] = mapped_column(String(255))
+    observaciones: Mapped[str | None] = mapped_column(String(500))
+    created_at: Mapped[datetime] = mapped_column(default=utcnow)
+
+    # lazy="raise": las relaciones deben cargarse explícitamente (join o selectinload)
+    asunto: Mapped["Asunto"] = relationship(lazy="raise")
 
 
 class Asistencia(Base):
     __tablename__ = "asistencia"
-    __table_args__ = {"extend_existing": True}
-    
-    id = Column(Integer, primary_key=True, index=True)
-    persona_id = Column(Integer, ForeignKey("personas.id"), nullable=False)
-    asunto_instancia_id = Column(Integer, ForeignKey("asunto_instancias.id"), nullable=False)
-    asistio = Column(Boolean, default=False, nullable=False)
-    fecha_marcado = Column(DateTime, nullable=True)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    __table_args__ = (
+        # La restricción única también sirve las búsquedas por persona_id
+        UniqueConstraint("persona_id", "asunto_instancia_id", name="uq_asist_persona_instancia"),
+        # Cubre el filtro por instancia y el conteo de presentes
+        Index("ix_asist_instancia_asistio", "asunto_instancia_id", "asistio"),
+        {"extend_existing": True},
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, index=True)
+    persona_id: Mapped[int] = mapped_column(ForeignKey("personas.id"))
+    asunto_instancia_id: Mapped[int] = mapped_column(ForeignKey("asunto_instancias.id"))
+    asistio: Mapped[bool] = mapped_column(default=False)
+    fecha_marcado: Mapped[datetime | None]
+    updated_at: Mapped[datetime] = mapped_column(default=utcnow, onupdate=utcnow)
 
+    persona: Mapped["Persona"] = relationship(lazy="raise")
+    instancia: Mapped["AsuntoInstancia"] = relationship(lazy="raise")
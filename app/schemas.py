@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from datetime import datetime, date
 
 # ========== AUTENTICACIÓN ==========
@@ -13,8 +13,7 @@ class UsuarioResponse(BaseModel):
     email: str
     rol: str
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class LoginResponse(BaseModel):
     token: str
@@ -43,8 +42,11 @@ class PersonaUpdate(BaseModel):
 class PersonaResponse(PersonaBase):
     id: int
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+class PersonaPage(BaseModel):
+    items: list[PersonaResponse]
+    next: int | None = None
 
 
 # ========== ASUNTOS ==========
@@ -69,8 +71,7 @@ class AsuntoResponse(AsuntoBase):
     id: int
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class AsuntoDetailResponse(AsuntoResponse):
     instancias: int = 0
@@ -97,8 +98,7 @@ class AsuntoInstanciaResponse(AsuntoInstanciaBase):
     id: int
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class AsuntoInstanciaDetailResponse(AsuntoInstanciaResponse):
     registrados: int = 0
@@ -118,13 +118,24 @@ class AsistenciaUpdate(BaseModel):
     asistio: bool
     fecha_marcado: datetime | None = None
 
+# Tope de elementos por petición masiva; mantiene cada sentencia bajo el límite
+# de 32767 parámetros de asyncpg (3 por fila insertada)
+BULK_MAX_ITEMS = 1000
+
+class AsistenciaBulkCreate(BaseModel):
+    persona_ids: list[int] = Field(..., min_length=1, max_length=BULK_MAX_ITEMS)
+    asistio: bool = False
+
+class AsistenciaBulkUpdate(BaseModel):
+    asistencia_ids: list[int] = Field(..., min_length=1, max_length=BULK_MAX_ITEMS)
+    asistio: bool
+
 class AsistenciaResponse(AsistenciaBase):
     id: int
     fecha_marcado: datetime | None = None
     updated_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class AsistenciaDetailResponse(BaseModel):
     id: int
@@ -133,6 +144,12 @@ class AsistenciaDetailResponse(BaseModel):
     rut: str
     asistio: bool
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+class AsistenciaHistorialCursor(BaseModel):
+    after_fecha: date
+    after_id: int
 
+class AsistenciaHistorialPage(BaseModel):
+    items: list[dict]
+    next: AsistenciaHistorialCursor | None = None
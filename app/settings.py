@@ -1,3 +1,4 @@
+from pydantic import model_validator
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -10,9 +11,33 @@ class Settings(BaseSettings):
     DEBUG: bool = True
     FRONTEND_URL: str
     
+    # Configuración del pool de conexiones
+    DB_POOL_SIZE: int = 20
+    DB_MAX_OVERFLOW: int = 30
+    # Usar PgBouncer (modo transacción) delante de Postgres en vez del pool propio;
+    # si no se define, se detecta por el host "-pooler" de la URL (Neon)
+    USE_PGBOUNCER: bool | None = None
+    # Crear tablas con create_all al iniciar (desactivar si el esquema se migra aparte)
+    DB_CREATE_TABLES: bool = True
+    
+    # Configuración del cache (opcional); sin REDIS_URL el cache queda desactivado
+    REDIS_URL: str | None = None
+    CACHE_TTL: int = 30
+    
     # Configuración de autenticación
     SECRET_KEY: str = "change-me-in-production-12345"  # Cambiar en .env
     
+    @model_validator(mode="after")
+    def detectar_pgbouncer(self):
+        if self.USE_PGBOUNCER is None:
+            self.USE_PGBOUNCER = "-pooler" in self.DATABASE_URL.lower()
+        return self
+    
+    @property
+    def DB_MODE(self) -> str:
+        """Modo de conexiones a la base de datos: "pgbouncer" o "pool" """
+        return "pgbouncer" if self.USE_PGBOUNCER else "pool"
+    
     class Config:
         env_file = ".env"
 
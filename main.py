@@ -1,22 +1,33 @@
+import asyncio
 import logging
+import orjson
+from datetime import date
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, Depends, HTTPException, status, Header
+from fastapi import FastAPI, Depends, HTTPException, status, Header, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import func, text
+from sqlalchemy import func, text, update, insert, delete, exists, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
 
 from app.models import Persona, Asunto, AsuntoInstancia, Asistencia, Base, Usuario
 from app.schemas import (
-    PersonaCreate, PersonaUpdate, PersonaResponse,
+    PersonaCreate, PersonaUpdate, PersonaResponse, PersonaPage,
     AsuntoCreate, AsuntoUpdate, AsuntoResponse, AsuntoDetailResponse,
     AsuntoInstanciaCreate, AsuntoInstanciaUpdate, AsuntoInstanciaResponse, AsuntoInstanciaDetailResponse,
     AsistenciaCreate, AsistenciaUpdate, AsistenciaResponse, AsistenciaDetailResponse,
+    AsistenciaBulkCreate, AsistenciaBulkUpdate, AsistenciaHistorialPage,
     LoginRequest, LoginResponse, UsuarioResponse, UsuarioCreate
 )
 from app.database import get_db, engine
+from app.cache import (
+    redis_client, cache_get, cache_set, cache_delete,
+    ASUNTOS_LIST_KEY, asunto_detail_key, asunto_instancias_key, instancia_counts_key
+)
 from app.settings import settings
-from app.utils import hash_password, verify_password, create_access_token, decode_token
+from app.utils import hash_password, verify_password, create_access_token, decode_token, utcnow
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -28,11 +39,64 @@ async def lifespan(app: FastAPI):
     """Maneja los eventos de startup y shutdown de la aplicación"""
     # Startup
     try:
-        async with engine.begin() as conn:
-            await conn.run_sync(Base.metadata.create_all)
-        print("✓ Tablas de base de datos creadas/verificadas")
+        # Crear tablas si está habilitado
+        if settings.DB_CREATE_TABLES:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+            print("✓ Tablas de base de datos creadas/verificadas")
+            
+            # create_all no altera tablas existentes: la restricción única de asistencia
+            # (necesaria para ON CONFLICT) se crea aparte si la tabla es anterior a ella.
+            # Si falla por duplicados, eliminarlos primero, por ejemplo:
+            #   DELETE FROM asistencia a USING asistencia b
+            #   WHERE a.persona_id = b.persona_id
+            #     AND a.asunto_instancia_id = b.asunto_instancia_id AND a.id > b.id;
+            try:
+                async with engine.begin() as conn:
+                    await conn.execute(text(
+                        "CREATE UNIQUE INDEX IF NOT EXISTS uq_asist_persona_instancia "
+                        "ON asistencia (persona_id, asunto_instancia_id)"
+                    ))
+                print("✓ Índice único de asistencia verificado")
+            except Exception as e:
+                logger.error(f"❌ No se pudo crear uq_asist_persona_instancia (¿registros duplicados?): {str(e)}")
+            
+            # Índices compuestos de las búsquedas por instancia y por asunto, por la misma razón
+            try:
+                async with engine.begin() as conn:
+                    await conn.execute(text(
+                        "CREATE INDEX IF NOT EXISTS ix_asist_instancia_asistio "
+                        "ON asistencia (asunto_instancia_id, asistio)"
+                    ))
+                    await conn.execute(text(
+                        "CREATE INDEX IF NOT EXISTS ix_inst_asunto_fecha "
+                        "ON asunto_instancias (asunto_id, fecha)"
+                    ))
+                print("✓ Índices de asistencia e instancias verificados")
+            except Exception as e:
+                logger.error(f"❌ No se pudieron crear los índices compuestos: {str(e)}")
         print(f"✓ CORS permitido para: {settings.FRONTEND_URL}")
         
+        # Abrir las conexiones del pool por adelantado para evitar latencia en las primeras peticiones
+        # (con PgBouncer no hay pool local que precalentar)
+        # Un fallo al precalentar no detiene el resto del startup
+        if not settings.USE_PGBOUNCER:
+            resultados = await asyncio.gather(
+                *[engine.connect() for _ in range(settings.DB_POOL_SIZE)],
+                return_exceptions=True
+            )
+            conexiones = [r for r in resultados if not isinstance(r, BaseException)]
+            for conn in conexiones:
+                await conn.close()
+            errores = [r for r in resultados if isinstance(r, BaseException)]
+            if errores:
+                logger.warning(
+                    f"⚠️ Precalentamiento parcial del pool: {len(conexiones)}/{len(resultados)} conexiones; "
+                    f"{type(errores[0]).__name__}: {str(errores[0])}"
+                )
+            else:
+                print(f"✓ Pool de conexiones precalentado: {len(conexiones)} conexiones")
+        
         # Crear usuarios demo si no existen
         from app.database import AsyncSessionLocal
         async with AsyncSessionLocal() as session:
@@ -77,35 +141,86 @@ async def lifespan(app: FastAPI):
     
     yield
     
-    # Shutdown (si es necesario)
+    # Shutdown
+    if redis_client is not None:
+        await redis_client.aclose()
+    await engine.dispose()
 
-app = FastAPI(title=settings.APP_NAME, version=settings.APP_VERSION, lifespan=lifespan)
+app = FastAPI(
+    title=settings.APP_NAME,
+    version=settings.APP_VERSION,
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
+)
 
 # Parsear FRONTEND_URL (puede ser una o múltiples separadas por coma)
-allowed_origins = [url.strip() for url in settings.FRONTEND_URL.split(",")]
+# Se normalizan igual que el header Origin que envía el navegador
+allowed_origins = frozenset(
+    url.strip().lower().rstrip("/") for url in settings.FRONTEND_URL.split(",") if url.strip()
+)
 
 # Configurar CORS
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=allowed_origins,
+    allow_origins=list(allowed_origins),
     allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-    allow_headers=["*"],
+    allow_methods=("GET", "POST", "PUT", "DELETE", "OPTIONS"),
+    allow_headers=("Authorization", "Content-Type"),
     expose_headers=["*"],
     max_age=3600,
 )
 
+# Tamaño de lote al transmitir listados con cursor del lado del servidor
+STREAM_YIELD_PER = 500
+
+async def stream_json_array(db: AsyncSession, stmt):
+    """Transmite el resultado de una consulta como arreglo JSON, un lote a la vez"""
+    result = await db.stream(stmt.execution_options(yield_per=STREAM_YIELD_PER))
+    yield b"["
+    separador = b""
+    async for filas in result.mappings().partitions():
+        yield separador + b",".join(orjson.dumps(dict(fila)) for fila in filas)
+        separador = b","
+    yield b"]"
+
+def restriccion_violada(e: IntegrityError) -> str | None:
+    """Retorna el nombre de la restricción que violó la sentencia (asyncpg), o None si no se conoce"""
+    return getattr(e.orig.__cause__, "constraint_name", None)
+
+def asunto_de_instancia(instancia_id):
+    """
+    Subconsulta escalar con el asunto_id de una instancia (id fijo o columna correlacionada);
+    se agrega al RETURNING de las escrituras de asistencia para invalidar el cache sin otra consulta
+    """
+    return select(AsuntoInstancia.asunto_id).where(AsuntoInstancia.id == instancia_id).scalar_subquery()
+
+async def invalidar_conteos_instancia(instancia_id: int, asunto_id: int | None):
+    """Invalida en el cache los conteos de una instancia y el listado de instancias de su asunto"""
+    keys = [instancia_counts_key(instancia_id)]
+    if asunto_id is not None:
+        keys.append(asunto_instancias_key(asunto_id))
+    await cache_delete(*keys)
+
 #Endpoints cru
 
-# GET: Obtener todas las personas
-@app.get("/personas/", response_model=list[PersonaResponse])
-async def get_personas(db: AsyncSession = Depends(get_db)):
-    """Obtiene la lista de todas las personas"""
+# GET: Obtener las personas, paginadas por id
+@app.get("/personas/", response_model=PersonaPage)
+async def get_personas(
+    after: int = 0,
+    limit: int = Query(100, ge=1, le=500),
+    db: AsyncSession = Depends(get_db)
+):
+    """Obtiene una página de personas con id mayor a `after`"""
     try:
-        result = await db.execute(select(Persona))
-        personas = result.scalars().all()
-        print(f"✓ Personas obtenidas: {len(personas)}")
-        return personas
+        # Consulta Core sin instanciar objetos ORM; los tipos ya vienen garantizados por la BD
+        result = await db.execute(
+            select(Persona.__table__).where(Persona.id > after).order_by(Persona.id).limit(limit)
+        )
+        personas = [PersonaResponse.model_construct(**fila) for fila in result.mappings()]
+        
+        # Solo hay página siguiente si esta vino completa
+        next_after = personas[-1].id if len(personas) == limit else None
+        return PersonaPage.model_construct(items=personas, next=next_after)
     except Exception as e:
         print(f"❌ Error en get_personas: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error al obtener personas: {str(e)}")
@@ -125,21 +240,19 @@ async def get_persona(persona_id: int, db: AsyncSession = Depends(get_db)):
 # POST: Crea una nueva persona
 @app.post("/personas/", response_model=PersonaResponse, status_code=status.HTTP_201_CREATED)
 async def create_persona(persona: PersonaCreate, db: AsyncSession = Depends(get_db)):
-    # Verificar que el RUT sea único
-    result = await db.execute(select(Persona).where(Persona.rut == persona.rut))
-    existing = result.scalar_one_or_none()
+    # Insertar solo si el RUT no existe (verificación atómica en la BD)
+    result = await db.execute(
+        pg_insert(Persona)
+        .values(**persona.model_dump())
+        .on_conflict_do_nothing(index_elements=["rut"])
+        .returning(Persona)
+    )
+    db_persona = result.scalar_one_or_none()
     
-    if existing:
+    if not db_persona:
         raise HTTPException(status_code=400, detail="El RUT ya existe")
     
-    db_persona = Persona(
-        rut=persona.rut,
-        apellidos=persona.apellidos,
-        nombres=persona.nombres
-    )
-    db.add(db_persona)
     await db.commit()
-    await db.refresh(db_persona)
     
     return db_persona
 
@@ -150,22 +263,19 @@ async def update_persona(
     db: AsyncSession = Depends(get_db)
 ):
     """Actualiza una persona existente"""
-    result = await db.execute(select(Persona).where(Persona.id == persona_id))
+    # Actualizar solo los campos proporcionados, en una sola sentencia UPDATE ... RETURNING
+    update_data = persona_update.model_dump(exclude_none=True)
+    if update_data:
+        stmt = update(Persona).where(Persona.id == persona_id).values(**update_data).returning(Persona)
+    else:
+        stmt = select(Persona).where(Persona.id == persona_id)
+    result = await db.execute(stmt)
     db_persona = result.scalar_one_or_none()
     
     if not db_persona:
         raise HTTPException(status_code=404, detail="Persona no encontrada")
     
-    # Actualizar solo los campos proporcionados
-    if persona_update.rut is not None:
-        db_persona.rut = persona_update.rut
-    if persona_update.apellidos is not None:
-        db_persona.apellidos = persona_update.apellidos
-    if persona_update.nombres is not None:
-        db_persona.nombres = persona_update.nombres
-    
     await db.commit()
-    await db.refresh(db_persona)
     
     return db_persona
 
@@ -264,7 +374,7 @@ async def login(credentials: LoginRequest, db: AsyncSession = Depends(get_db)):
         # Crear token JWT
         token = create_access_token(data={"sub": str(usuario.id), "username": usuario.username})
         
-        usuario_response = UsuarioResponse(
+        usuario_response = UsuarioResponse.model_construct(
             id=usuario.id,
             username=usuario.username,
             nombre=usuario.nombre,
@@ -283,7 +393,7 @@ async def login(credentials: LoginRequest, db: AsyncSession = Depends(get_db)):
 @app.get("/me/", response_model=UsuarioResponse)
 async def get_me(usuario: Usuario = Depends(get_current_user)):
     """Obtiene los datos del usuario autenticado"""
-    return UsuarioResponse(
+    return UsuarioResponse.model_construct(
         id=usuario.id,
         username=usuario.username,
         nombre=usuario.nombre,
@@ -296,29 +406,34 @@ async def get_me(usuario: Usuario = Depends(get_current_user)):
 async def create_usuario(usuario_data: UsuarioCreate, db: AsyncSession = Depends(get_db)):
     """Crea un nuevo usuario (admin only)"""
     try:
-        # Verificar que el username sea único
-        result = await db.execute(select(Usuario).where(Usuario.username == usuario_data.username))
-        if result.scalar_one_or_none():
-            raise HTTPException(status_code=400, detail="El username ya existe")
+        # Verificar que el username y el email sean únicos en una sola consulta
+        result = await db.execute(
+            select(
+                exists().where(Usuario.username == usuario_data.username),
+                exists().where(Usuario.email == usuario_data.email)
+            )
+        )
+        username_existe, email_existe = result.one()
         
-        # Verificar que el email sea único
-        result = await db.execute(select(Usuario).where(Usuario.email == usuario_data.email))
-        if result.scalar_one_or_none():
+        if username_existe:
+            raise HTTPException(status_code=400, detail="El username ya existe")
+        if email_existe:
             raise HTTPException(status_code=400, detail="El email ya existe")
         
         # Crear usuario
-        db_usuario = Usuario(
-            username=usuario_data.username,
-            email=usuario_data.email,
-            nombre=usuario_data.nombre,
-            password_hash=hash_password(usuario_data.password),
-            rol=usuario_data.rol
+        result = await db.execute(
+            insert(Usuario).values(
+                username=usuario_data.username,
+                email=usuario_data.email,
+                nombre=usuario_data.nombre,
+                password_hash=hash_password(usuario_data.password),
+                rol=usuario_data.rol
+            ).returning(Usuario)
         )
-        db.add(db_usuario)
+        db_usuario = result.scalar_one()
         await db.commit()
-        await db.refresh(db_usuario)
         
-        return UsuarioResponse(
+        return UsuarioResponse.model_construct(
             id=db_usuario.id,
             username=db_usuario.username,
             nombre=db_usuario.nombre,
@@ -338,31 +453,26 @@ async def create_usuario(usuario_data: UsuarioCreate, db: AsyncSession = Depends
 async def get_asuntos(db: AsyncSession = Depends(get_db)):
     """Obtiene la lista de todos los asuntos"""
     try:
-        result = await db.execute(select(Asunto))
-        asuntos = result.scalars().all()
+        cached = await cache_get(ASUNTOS_LIST_KEY)
+        if cached is not None:
+            return Response(content=cached, media_type="application/json")
         
-        # Contar instancias para cada asunto
-        response = []
-        for asunto in asuntos:
-            count_result = await db.execute(
-                select(func.count(AsuntoInstancia.id)).where(AsuntoInstancia.asunto_id == asunto.id)
-            )
-            instancias_count = count_result.scalar() or 0
-            
-            # Crear diccionario con los datos del asunto y el conteo
-            asunto_dict = {
-                "id": asunto.id,
-                "nombre": asunto.nombre,
-                "tipo": asunto.tipo,
-                "descripcion": asunto.descripcion,
-                "coordinadora": asunto.coordinadora,
-                "lugar": asunto.lugar,
-                "created_at": asunto.created_at,
-                "instancias": instancias_count
-            }
-            response.append(asunto_dict)
+        # Contar instancias de todos los asuntos en una sola consulta agrupada
+        conteos = (
+            select(AsuntoInstancia.asunto_id, func.count(AsuntoInstancia.id).label("total"))
+            .group_by(AsuntoInstancia.asunto_id)
+            .subquery()
+        )
+        result = await db.execute(
+            select(Asunto.__table__, func.coalesce(conteos.c.total, 0).label("instancias"))
+            .outerjoin(conteos, conteos.c.asunto_id == Asunto.id)
+        )
+        
+        # Cada fila ya trae los datos del asunto y el conteo
+        response = [dict(fila) for fila in result.mappings()]
         
         print(f"✓ Asuntos obtenidos: {len(response)}")
+        await cache_set(ASUNTOS_LIST_KEY, orjson.dumps(response))
         return response
     except Exception as e:
         print(f"❌ Error en get_asuntos: {str(e)}")
@@ -373,30 +483,25 @@ async def get_asuntos(db: AsyncSession = Depends(get_db)):
 async def get_asunto(asunto_id: int, db: AsyncSession = Depends(get_db)):
     """Obtiene un asunto específico"""
     try:
-        result = await db.execute(select(Asunto).where(Asunto.id == asunto_id))
-        asunto = result.scalar_one_or_none()
+        cached = await cache_get(asunto_detail_key(asunto_id))
+        if cached is not None:
+            return Response(content=cached, media_type="application/json")
         
-        if not asunto:
-            raise HTTPException(status_code=404, detail="Asunto no encontrado")
-        
-        # Contar instancias
-        count_result = await db.execute(
-            select(func.count(AsuntoInstancia.id)).where(AsuntoInstancia.asunto_id == asunto.id)
+        # Obtener el asunto y contar sus instancias en una sola consulta
+        result = await db.execute(
+            select(Asunto.__table__, func.count(AsuntoInstancia.id).label("instancias"))
+            .outerjoin(AsuntoInstancia, AsuntoInstancia.asunto_id == Asunto.id)
+            .where(Asunto.id == asunto_id)
+            .group_by(Asunto.id)
         )
-        instancias_count = count_result.scalar() or 0
+        row = result.mappings().one_or_none()
         
-        # Crear diccionario con los datos del asunto y el conteo
-        asunto_dict = {
-            "id": asunto.id,
-            "nombre": asunto.nombre,
-            "tipo": asunto.tipo,
-            "descripcion": asunto.descripcion,
-            "coordinadora": asunto.coordinadora,
-            "lugar": asunto.lugar,
-            "created_at": asunto.created_at,
-            "instancias": instancias_count
-        }
+        if not row:
+            raise HTTPException(status_code=404, detail="Asunto no encontrado")
         
+        asunto_dict = dict(row)
+        
+        await cache_set(asunto_detail_key(asunto_id), orjson.dumps(asunto_dict))
         return asunto_dict
     except HTTPException:
         raise
@@ -408,35 +513,39 @@ async def get_asunto(asunto_id: int, db: AsyncSession = Depends(get_db)):
 @app.post("/asuntos/", response_model=AsuntoResponse, status_code=status.HTTP_201_CREATED)
 async def create_asunto(asunto: AsuntoCreate, db: AsyncSession = Depends(get_db)):
     """Crea un nuevo asunto"""
-    # Verificar que el nombre sea único
-    result = await db.execute(select(Asunto).where(Asunto.nombre == asunto.nombre))
-    existing = result.scalar_one_or_none()
+    # Insertar solo si el nombre no existe (verificación atómica en la BD)
+    result = await db.execute(
+        pg_insert(Asunto)
+        .values(**asunto.model_dump())
+        .on_conflict_do_nothing(index_elements=["nombre"])
+        .returning(Asunto)
+    )
+    db_asunto = result.scalar_one_or_none()
     
-    if existing:
+    if not db_asunto:
         raise HTTPException(status_code=400, detail="El nombre del asunto ya existe")
     
-    db_asunto = Asunto(**asunto.dict())
-    db.add(db_asunto)
     await db.commit()
-    await db.refresh(db_asunto)
+    await cache_delete(ASUNTOS_LIST_KEY)
     
     return db_asunto
 
 @app.put("/asuntos/{asunto_id}", response_model=AsuntoResponse)
 async def update_asunto(asunto_id: int, asunto_update: AsuntoUpdate, db: AsyncSession = Depends(get_db)):
     """Actualiza un asunto existente"""
-    result = await db.execute(select(Asunto).where(Asunto.id == asunto_id))
+    update_data = asunto_update.model_dump(exclude_unset=True)
+    if update_data:
+        stmt = update(Asunto).where(Asunto.id == asunto_id).values(**update_data).returning(Asunto)
+    else:
+        stmt = select(Asunto).where(Asunto.id == asunto_id)
+    result = await db.execute(stmt)
     db_asunto = result.scalar_one_or_none()
     
     if not db_asunto:
         raise HTTPException(status_code=404, detail="Asunto no encontrado")
     
-    update_data = asunto_update.dict(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(db_asunto, key, value)
-    
     await db.commit()
-    await db.refresh(db_asunto)
+    await cache_delete(ASUNTOS_LIST_KEY, asunto_detail_key(asunto_id))
     
     return db_asunto
 
@@ -451,6 +560,7 @@ async def delete_asunto(asunto_id: int, db: AsyncSession = Depends(get_db)):
     
     await db.delete(db_asunto)
     await db.commit()
+    await cache_delete(ASUNTOS_LIST_KEY, asunto_detail_key(asunto_id), asunto_instancias_key(asunto_id))
 
 
 # ========== ENDPOINTS INSTANCIAS ==========
@@ -459,40 +569,41 @@ async def delete_asunto(asunto_id: int, db: AsyncSession = Depends(get_db)):
 async def get_instancias_por_asunto(asunto_id: int, db: AsyncSession = Depends(get_db)):
     """Obtiene todas las instancias de un asunto"""
     try:
-        result = await db.execute(select(AsuntoInstancia).where(AsuntoInstancia.asunto_id == asunto_id))
-        instancias = result.scalars().all()
+        cached = await cache_get(asunto_instancias_key(asunto_id))
+        if cached is not None:
+            return Response(content=cached, media_type="application/json")
         
-        if not instancias:
-            # Verificar que el asunto exista
-            asunto_result = await db.execute(select(Asunto).where(Asunto.id == asunto_id))
-            if not asunto_result.scalar_one_or_none():
-                raise HTTPException(status_code=404, detail="Asunto no encontrado")
-        
-        # Contar registrados y presentes
-        response = []
-        for instancia in instancias:
-            registrados = await db.execute(
-                select(func.count(Asistencia.id)).where(Asistencia.asunto_instancia_id == instancia.id)
+        # Contar registrados y presentes de todas las instancias en una sola consulta agrupada
+        conteos = (
+            select(
+                Asistencia.asunto_instancia_id,
+                func.count(Asistencia.id).label("registrados"),
+                func.count(Asistencia.id).filter(Asistencia.asistio.is_(True)).label("presentes")
             )
-            presentes = await db.execute(
-                select(func.count(Asistencia.id)).where(
-                    (Asistencia.asunto_instancia_id == instancia.id) & (Asistencia.asistio == True)
-                )
+            .where(Asistencia.asunto_instancia_id.in_(
+                select(AsuntoInstancia.id).where(AsuntoInstancia.asunto_id == asunto_id)
+            ))
+            .group_by(Asistencia.asunto_instancia_id)
+            .subquery()
+        )
+        result = await db.execute(
+            select(
+                AsuntoInstancia.__table__,
+                func.coalesce(conteos.c.registrados, 0).label("registrados"),
+                func.coalesce(conteos.c.presentes, 0).label("presentes")
             )
-            
-            instancia_dict = {
-                "id": instancia.id,
-                "asunto_id": instancia.asunto_id,
-                "fecha": instancia.fecha,
-                "lugar": instancia.lugar,
-                "coordinadora": instancia.coordinadora,
-                "observaciones": instancia.observaciones,
-                "created_at": instancia.created_at,
-                "registrados": registrados.scalar() or 0,
-                "presentes": presentes.scalar() or 0
-            }
-            response.append(instancia_dict)
+            .outerjoin(conteos, conteos.c.asunto_instancia_id == AsuntoInstancia.id)
+            .where(AsuntoInstancia.asunto_id == asunto_id)
+        )
+        response = [dict(fila) for fila in result.mappings()]
+        
+        if not response:
+            # Verificar que el asunto exista
+            asunto_result = await db.execute(select(Asunto.id).where(Asunto.id == asunto_id))
+            if asunto_result.scalar_one_or_none() is None:
+                raise HTTPException(status_code=404, detail="Asunto no encontrado")
         
+        await cache_set(asunto_instancias_key(asunto_id), orjson.dumps(response))
         return response
     except HTTPException:
         raise
@@ -505,33 +616,34 @@ async def get_instancias_por_asunto(asunto_id: int, db: AsyncSession = Depends(g
 async def get_instancia(instancia_id: int, db: AsyncSession = Depends(get_db)):
     """Obtiene una instancia específica"""
     try:
-        result = await db.execute(select(AsuntoInstancia).where(AsuntoInstancia.id == instancia_id))
-        instancia = result.scalar_one_or_none()
-        
-        if not instancia:
-            raise HTTPException(status_code=404, detail="Instancia no encontrada")
-        
-        # Contar registrados y presentes
-        registrados = await db.execute(
-            select(func.count(Asistencia.id)).where(Asistencia.asunto_instancia_id == instancia.id)
-        )
-        presentes = await db.execute(
-            select(func.count(Asistencia.id)).where(
-                (Asistencia.asunto_instancia_id == instancia.id) & (Asistencia.asistio == True)
+        # Contar registrados y presentes (o tomarlos del cache)
+        cached = await cache_get(instancia_counts_key(instancia_id))
+        if cached is not None:
+            result = await db.execute(
+                select(AsuntoInstancia.__table__).where(AsuntoInstancia.id == instancia_id)
             )
-        )
+            fila = result.mappings().one_or_none()
+            instancia_dict = {**fila, **orjson.loads(cached)} if fila else None
+        else:
+            # Obtener la instancia y ambos conteos en una sola consulta
+            result = await db.execute(
+                select(
+                    AsuntoInstancia.__table__,
+                    func.count(Asistencia.id).label("registrados"),
+                    func.count(Asistencia.id).filter(Asistencia.asistio.is_(True)).label("presentes")
+                )
+                .outerjoin(Asistencia, Asistencia.asunto_instancia_id == AsuntoInstancia.id)
+                .where(AsuntoInstancia.id == instancia_id)
+                .group_by(AsuntoInstancia.id)
+            )
+            fila = result.mappings().one_or_none()
+            instancia_dict = dict(fila) if fila else None
+            if instancia_dict:
+                conteos = {"registrados": fila["registrados"], "presentes": fila["presentes"]}
+                await cache_set(instancia_counts_key(instancia_id), orjson.dumps(conteos))
         
-        instancia_dict = {
-            "id": instancia.id,
-            "asunto_id": instancia.asunto_id,
-            "fecha": instancia.fecha,
-            "lugar": instancia.lugar,
-            "coordinadora": instancia.coordinadora,
-            "observaciones": instancia.observaciones,
-            "created_at": instancia.created_at,
-            "registrados": registrados.scalar() or 0,
-            "presentes": presentes.scalar() or 0
-        }
+        if not instancia_dict:
+            raise HTTPException(status_code=404, detail="Instancia no encontrada")
         
         return instancia_dict
     except HTTPException:
@@ -544,33 +656,46 @@ async def get_instancia(instancia_id: int, db: AsyncSession = Depends(get_db)):
 @app.post("/instancias/", response_model=AsuntoInstanciaResponse, status_code=status.HTTP_201_CREATED)
 async def create_instancia(instancia: AsuntoInstanciaCreate, db: AsyncSession = Depends(get_db)):
     """Crea una nueva instancia de asunto"""
-    # Verificar que el asunto exista
-    asunto_result = await db.execute(select(Asunto).where(Asunto.id == instancia.asunto_id))
-    if not asunto_result.scalar_one_or_none():
+    # La llave foránea valida que el asunto exista
+    try:
+        result = await db.execute(
+            insert(AsuntoInstancia).values(**instancia.model_dump()).returning(AsuntoInstancia)
+        )
+    except IntegrityError:
+        await db.rollback()
         raise HTTPException(status_code=404, detail="Asunto no encontrado")
     
-    db_instancia = AsuntoInstancia(**instancia.dict())
-    db.add(db_instancia)
+    db_instancia = result.scalar_one()
     await db.commit()
-    await db.refresh(db_instancia)
+    await cache_delete(
+        ASUNTOS_LIST_KEY,
+        asunto_detail_key(db_instancia.asunto_id),
+        asunto_instancias_key(db_instancia.asunto_id)
+    )
     
     return db_instancia
 
 @app.put("/instancias/{instancia_id}", response_model=AsuntoInstanciaResponse)
 async def update_instancia(instancia_id: int, instancia_update: AsuntoInstanciaUpdate, db: AsyncSession = Depends(get_db)):
     """Actualiza una instancia de asunto"""
-    result = await db.execute(select(AsuntoInstancia).where(AsuntoInstancia.id == instancia_id))
+    update_data = instancia_update.model_dump(exclude_unset=True)
+    if update_data:
+        stmt = (
+            update(AsuntoInstancia)
+            .where(AsuntoInstancia.id == instancia_id)
+            .values(**update_data)
+            .returning(AsuntoInstancia)
+        )
+    else:
+        stmt = select(AsuntoInstancia).where(AsuntoInstancia.id == instancia_id)
+    result = await db.execute(stmt)
     db_instancia = result.scalar_one_or_none()
     
     if not db_instancia:
         raise HTTPException(status_code=404, detail="Instancia no encontrada")
     
-    update_data = instancia_update.dict(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(db_instancia, key, value)
-    
     await db.commit()
-    await db.refresh(db_instancia)
+    await cache_delete(asunto_instancias_key(db_instancia.asunto_id))
     
     return db_instancia
 
@@ -585,6 +710,12 @@ async def delete_instancia(instancia_id: int, db: AsyncSession = Depends(get_db)
     
     await db.delete(db_instancia)
     await db.commit()
+    await cache_delete(
+        ASUNTOS_LIST_KEY,
+        asunto_detail_key(db_instancia.asunto_id),
+        asunto_instancias_key(db_instancia.asunto_id),
+        instancia_counts_key(instancia_id)
+    )
 
 
 # ========== ENDPOINTS ASISTENCIA ==========
@@ -593,117 +724,132 @@ async def delete_instancia(instancia_id: int, db: AsyncSession = Depends(get_db)
 async def get_asistencia_por_instancia(instancia_id: int, db: AsyncSession = Depends(get_db)):
     """Obtiene todos los registros de asistencia de una instancia"""
     # Verificar que la instancia exista
-    instancia_result = await db.execute(select(AsuntoInstancia).where(AsuntoInstancia.id == instancia_id))
-    if not instancia_result.scalar_one_or_none():
+    instancia_result = await db.execute(select(AsuntoInstancia.id).where(AsuntoInstancia.id == instancia_id))
+    if instancia_result.scalar_one_or_none() is None:
         raise HTTPException(status_code=404, detail="Instancia no encontrada")
     
-    result = await db.execute(
-        select(Asistencia, Persona).join(Persona).where(Asistencia.asunto_instancia_id == instancia_id)
+    # Seleccionar solo las columnas necesarias y armar el nombre en SQL
+    stmt = (
+        select(
+            Asistencia.id,
+            Persona.id.label("persona_id"),
+            (Persona.nombres + " " + Persona.apellidos).label("nombre"),
+            Persona.rut,
+            Asistencia.asistio
+        )
+        .join(Asistencia.persona)
+        .where(Asistencia.asunto_instancia_id == instancia_id)
     )
-    registros = result.all()
-    
-    responses = []
-    for asistencia, persona in registros:
-        responses.append({
-            "id": asistencia.id,
-            "persona_id": persona.id,
-            "nombre": f"{persona.nombres} {persona.apellidos}",
-            "rut": persona.rut,
-            "asistio": asistencia.asistio
-        })
-    
-    return responses
-
-@app.get("/personas/{persona_id}/asistencia/", response_model=list[dict])
-async def get_asistencia_por_persona(persona_id: int, db: AsyncSession = Depends(get_db)):
-    """Obtiene el historial de asistencia de una persona"""
+    
+    return StreamingResponse(stream_json_array(db, stmt), media_type="application/json")
+
+@app.get("/personas/{persona_id}/asistencia/", response_model=AsistenciaHistorialPage)
+async def get_asistencia_por_persona(
+    persona_id: int,
+    after_fecha: date | None = None,
+    after_id: int | None = None,
+    limit: int = Query(100, ge=1, le=500),
+    db: AsyncSession = Depends(get_db)
+):
+    """Obtiene una página del historial de asistencia de una persona, de la más reciente a la más antigua"""
+    if (after_fecha is None) != (after_id is None):
+        raise HTTPException(status_code=400, detail="after_fecha y after_id deben indicarse juntos")
+    
     # Verificar que la persona exista
-    persona_result = await db.execute(select(Persona).where(Persona.id == persona_id))
-    persona = persona_result.scalar_one_or_none()
-    if not persona:
+    persona_result = await db.execute(select(Persona.id).where(Persona.id == persona_id))
+    if persona_result.scalar_one_or_none() is None:
         raise HTTPException(status_code=404, detail="Persona no encontrada")
     
-    result = await db.execute(
-        select(Asistencia, AsuntoInstancia, Asunto).join(
-            AsuntoInstancia
-        ).join(
-            Asunto
-        ).where(Asistencia.persona_id == persona_id).order_by(AsuntoInstancia.fecha.desc())
+    # Seleccionar solo las columnas necesarias; lugar y coordinadora vacíos se heredan del asunto
+    stmt = (
+        select(
+            Asistencia.id,
+            Asunto.nombre.label("asunto"),
+            AsuntoInstancia.fecha,
+            Asistencia.asistio,
+            func.coalesce(func.nullif(AsuntoInstancia.lugar, ""), Asunto.lugar).label("lugar"),
+            func.coalesce(func.nullif(AsuntoInstancia.coordinadora, ""), Asunto.coordinadora).label("coordinadora")
+        )
+        .join(Asistencia.instancia)
+        .join(AsuntoInstancia.asunto)
+        .where(Asistencia.persona_id == persona_id)
+        .order_by(AsuntoInstancia.fecha.desc(), Asistencia.id.desc())
+        .limit(limit)
     )
-    registros = result.all()
+    if after_fecha is not None:
+        stmt = stmt.where(tuple_(AsuntoInstancia.fecha, Asistencia.id) < tuple_(after_fecha, after_id))
     
-    responses = []
-    for asistencia, instancia, asunto in registros:
-        responses.append({
-            "id": asistencia.id,
-            "asunto": asunto.nombre,
-            "fecha": instancia.fecha,
-            "asistio": asistencia.asistio,
-            "lugar": instancia.lugar or asunto.lugar,
-            "coordinadora": instancia.coordinadora or asunto.coordinadora
-        })
+    result = await db.execute(stmt)
+    registros = result.mappings().all()
     
-    return responses
+    # Solo hay página siguiente si esta vino completa
+    next_cursor = None
+    if len(registros) == limit:
+        next_cursor = {"after_fecha": registros[-1]["fecha"], "after_id": registros[-1]["id"]}
+    return {"items": registros, "next": next_cursor}
 
 @app.post("/asistencia/", response_model=AsistenciaResponse, status_code=status.HTTP_201_CREATED)
 async def create_asistencia(asistencia: AsistenciaCreate, db: AsyncSession = Depends(get_db)):
     """Registra una persona en una instancia de asunto"""
-    # Verificar que la persona exista
-    persona_result = await db.execute(select(Persona).where(Persona.id == asistencia.persona_id))
-    if not persona_result.scalar_one_or_none():
-        raise HTTPException(status_code=404, detail="Persona no encontrada")
-    
-    # Verificar que la instancia exista
-    instancia_result = await db.execute(select(AsuntoInstancia).where(AsuntoInstancia.id == asistencia.asunto_instancia_id))
-    if not instancia_result.scalar_one_or_none():
+    # Insertar solo si no está duplicada; las llaves foráneas validan persona e instancia
+    try:
+        result = await db.execute(
+            pg_insert(Asistencia)
+            .values(**asistencia.model_dump())
+            .on_conflict_do_nothing(index_elements=["persona_id", "asunto_instancia_id"])
+            .returning(Asistencia, asunto_de_instancia(asistencia.asunto_instancia_id))
+        )
+    except IntegrityError as e:
+        await db.rollback()
+        if restriccion_violada(e) == "asistencia_persona_id_fkey":
+            raise HTTPException(status_code=404, detail="Persona no encontrada")
         raise HTTPException(status_code=404, detail="Instancia no encontrada")
     
-    # Verificar que no esté duplicada
-    existing = await db.execute(
-        select(Asistencia).where(
-            (Asistencia.persona_id == asistencia.persona_id) & 
-            (Asistencia.asunto_instancia_id == asistencia.asunto_instancia_id)
-        )
-    )
-    if existing.scalar_one_or_none():
+    fila = result.one_or_none()
+    if not fila:
         raise HTTPException(status_code=400, detail="Esta persona ya está registrada en esta instancia")
+    db_asistencia, asunto_id = fila
     
-    db_asistencia = Asistencia(**asistencia.dict())
-    db.add(db_asistencia)
     await db.commit()
-    await db.refresh(db_asistencia)
+    await invalidar_conteos_instancia(db_asistencia.asunto_instancia_id, asunto_id)
     
     return db_asistencia
 
 @app.put("/asistencia/{asistencia_id}", response_model=AsistenciaResponse)
 async def update_asistencia(asistencia_id: int, asistencia_update: AsistenciaUpdate, db: AsyncSession = Depends(get_db)):
     """Marca asistencia de una persona (presente/ausente)"""
-    result = await db.execute(select(Asistencia).where(Asistencia.id == asistencia_id))
-    db_asistencia = result.scalar_one_or_none()
+    result = await db.execute(
+        update(Asistencia)
+        .where(Asistencia.id == asistencia_id)
+        .values(asistio=asistencia_update.asistio, fecha_marcado=utcnow())
+        .returning(Asistencia, asunto_de_instancia(Asistencia.asunto_instancia_id))
+    )
+    fila = result.one_or_none()
     
-    if not db_asistencia:
+    if not fila:
         raise HTTPException(status_code=404, detail="Registro de asistencia no encontrado")
-    
-    from datetime import datetime
-    db_asistencia.asistio = asistencia_update.asistio
-    db_asistencia.fecha_marcado = datetime.utcnow()
+    db_asistencia, asunto_id = fila
     
     await db.commit()
-    await db.refresh(db_asistencia)
+    await invalidar_conteos_instancia(db_asistencia.asunto_instancia_id, asunto_id)
     
     return db_asistencia
 
 @app.delete("/asistencia/{asistencia_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_asistencia(asistencia_id: int, db: AsyncSession = Depends(get_db)):
     """Elimina un registro de asistencia"""
-    result = await db.execute(select(Asistencia).where(Asistencia.id == asistencia_id))
-    db_asistencia = result.scalar_one_or_none()
+    result = await db.execute(
+        delete(Asistencia)
+        .where(Asistencia.id == asistencia_id)
+        .returning(Asistencia.asunto_instancia_id, asunto_de_instancia(Asistencia.asunto_instancia_id))
+    )
+    fila = result.one_or_none()
     
-    if not db_asistencia:
+    if not fila:
         raise HTTPException(status_code=404, detail="Registro de asistencia no encontrado")
     
-    await db.delete(db_asistencia)
     await db.commit()
+    await invalidar_conteos_instancia(*fila)
 
 @app.post("/instancias/{instancia_id}/registrar", status_code=status.HTTP_201_CREATED)
 async def registrar_persona_instancia(instancia_id: int, data: dict, db: AsyncSession = Depends(get_db)):
@@ -714,37 +860,80 @@ async def registrar_persona_instancia(instancia_id: int, data: dict, db: AsyncSe
     if not persona_id:
         raise HTTPException(status_code=400, detail="persona_id es requerido")
     
-    # Verificar que la instancia exista
-    instancia_result = await db.execute(select(AsuntoInstancia).where(AsuntoInstancia.id == instancia_id))
-    if not instancia_result.scalar_one_or_none():
+    # Crear registro solo si no está duplicado; las llaves foráneas validan persona e instancia
+    try:
+        result = await db.execute(
+            pg_insert(Asistencia)
+            .values(persona_id=persona_id, asunto_instancia_id=instancia_id, asistio=asistio)
+            .on_conflict_do_nothing(index_elements=["persona_id", "asunto_instancia_id"])
+            .returning(Asistencia.id, asunto_de_instancia(instancia_id))
+        )
+    except IntegrityError as e:
+        await db.rollback()
+        if restriccion_violada(e) == "asistencia_persona_id_fkey":
+            raise HTTPException(status_code=404, detail="Persona no encontrada")
         raise HTTPException(status_code=404, detail="Instancia no encontrada")
     
-    # Verificar que la persona exista
-    persona_result = await db.execute(select(Persona).where(Persona.id == persona_id))
-    if not persona_result.scalar_one_or_none():
-        raise HTTPException(status_code=404, detail="Persona no encontrada")
+    fila = result.one_or_none()
+    if fila is None:
+        return {"message": "Persona ya está registrada"}
+    asistencia_id, asunto_id = fila
+    
+    await db.commit()
+    await invalidar_conteos_instancia(instancia_id, asunto_id)
     
-    # Verificar que no esté duplicada
-    existing = await db.execute(
-        select(Asistencia).where(
-            (Asistencia.persona_id == persona_id) & 
-            (Asistencia.asunto_instancia_id == instancia_id)
+    return {"id": asistencia_id, "persona_id": persona_id, "asistio": asistio}
+
+@app.post("/instancias/{instancia_id}/registrar_bulk", status_code=status.HTTP_201_CREATED)
+async def registrar_personas_instancia(instancia_id: int, data: AsistenciaBulkCreate, db: AsyncSession = Depends(get_db)):
+    """Registra varias personas en una instancia con una sola sentencia"""
+    persona_ids = list(dict.fromkeys(data.persona_ids))
+    valores = [
+        {"persona_id": persona_id, "asunto_instancia_id": instancia_id, "asistio": data.asistio}
+        for persona_id in persona_ids
+    ]
+    
+    # Las personas ya registradas se omiten; las llaves foráneas validan personas e instancia
+    try:
+        result = await db.execute(
+            pg_insert(Asistencia)
+            .values(valores)
+            .on_conflict_do_nothing(index_elements=["persona_id", "asunto_instancia_id"])
+            .returning(Asistencia.id, asunto_de_instancia(instancia_id))
         )
-    )
-    if existing.scalar_one_or_none():
-        return {"message": "Persona ya está registrada"}
+    except IntegrityError as e:
+        await db.rollback()
+        if restriccion_violada(e) == "asistencia_persona_id_fkey":
+            raise HTTPException(status_code=404, detail="Persona no encontrada")
+        raise HTTPException(status_code=404, detail="Instancia no encontrada")
+    
+    filas = result.all()
+    ids = [fila.id for fila in filas]
+    await db.commit()
+    if filas:
+        await invalidar_conteos_instancia(instancia_id, filas[0][1])
     
-    # Crear registro
-    db_asistencia = Asistencia(
-        persona_id=persona_id,
-        asunto_instancia_id=instancia_id,
-        asistio=asistio
+    return {"registrados": len(ids), "omitidos": len(persona_ids) - len(ids), "ids": ids}
+
+@app.put("/instancias/{instancia_id}/asistencia_bulk")
+async def marcar_asistencia_instancia(instancia_id: int, data: AsistenciaBulkUpdate, db: AsyncSession = Depends(get_db)):
+    """Marca asistencia (presente/ausente) de varios registros de una instancia con una sola sentencia"""
+    result = await db.execute(
+        update(Asistencia)
+        .where(
+            (Asistencia.asunto_instancia_id == instancia_id) &
+            (Asistencia.id.in_(data.asistencia_ids))
+        )
+        .values(asistio=data.asistio, fecha_marcado=utcnow())
+        .returning(asunto_de_instancia(instancia_id))
+        .execution_options(synchronize_session=False)
     )
-    db.add(db_asistencia)
+    asunto_ids = result.scalars().all()
     await db.commit()
-    await db.refresh(db_asistencia)
+    if asunto_ids:
+        await invalidar_conteos_instancia(instancia_id, asunto_ids[0])
     
-    return {"id": db_asistencia.id, "persona_id": persona_id, "asistio": asistio}
+    return {"actualizados": len(asunto_ids)}
 
 if __name__ == "__main__":
     import uvicorn